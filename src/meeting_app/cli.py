@@ -6,11 +6,23 @@ import time
 import argparse
 import subprocess
 import re
+import math
+import wave
+import shutil
+import difflib
+import hashlib
+import bisect
+import uuid
+import io
+import queue
+import http.client
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 import urllib.request
 import urllib.error
-
-from tqdm import tqdm
+import urllib.parse
 
 # =========================
 # KONFIGURACJA
@@ -22,9 +34,36 @@ DEFAULT_TRANSLATE_MODEL = os.environ.get("LMSTUDIO_TRANSLATE_MODEL", "bielik-1.5
 
 WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "mlx-community/whisper-large-v3-turbo")
 
+# Równoległa transkrypcja: nagranie dzielone na kawałki z zakładką.
+# Z API mlx_whisper workery trzymają model w pamięci -> kawałki kończące się
+# po kolei, więc tekst spływa od razu: min WHISPER_CHUNK_SEC, najwyżej
+# WHISPER_PIECES_PER_WORKER na workera (każda granica to sklejanie zakładki).
+# Przez CLI każdy kawałek to osobne ładowanie modelu -> jeden kawałek
+# na workera, nie krótszy niż WHISPER_MIN_CHUNK_SEC.
+WHISPER_WORKERS = int(os.environ.get("WHISPER_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+WHISPER_CHUNK_SEC = int(os.environ.get("WHISPER_CHUNK_SEC", "35"))
+WHISPER_PIECES_PER_WORKER = int(os.environ.get("WHISPER_PIECES_PER_WORKER", "8"))
+WHISPER_MIN_CHUNK_SEC = int(os.environ.get("WHISPER_MIN_CHUNK_SEC", "120"))
+WHISPER_OVERLAP_SEC = int(os.environ.get("WHISPER_OVERLAP_SEC", "2"))
+
 DEFAULT_OUT_DIR = Path(os.environ.get("OUT_DIR", str(Path.home() / "Downloads" / "transcripts_app")))
 
-DEFAULT_CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", "4000"))
+# Chunkowanie transkrypcji w tokenach (tiktoken cl100k_base albo szacunek
+# CHARS_PER_TOKEN znaków/token); koniec chunka dociągany do końca zdania
+CHARS_PER_TOKEN = float(os.environ.get("CHARS_PER_TOKEN", "2.5"))
+if "CHUNK_TOKENS" not in os.environ and "CHUNK_SIZE" in os.environ:
+    # stara zmienna CHUNK_SIZE (w znakach) -> przeliczamy na tokeny
+    CHUNK_TOKENS = max(1, int(int(os.environ["CHUNK_SIZE"]) / CHARS_PER_TOKEN))
+else:
+    CHUNK_TOKENS = max(1, int(os.environ.get("CHUNK_TOKENS", "2500")))
+# zakładka max połowa chunka - inaczej każdy chunk przesuwałby się o kilka tokenów
+CHUNK_OVERLAP_TOKENS = max(0, min(int(os.environ.get("CHUNK_OVERLAP_TOKENS", "128")), CHUNK_TOKENS // 2))
+CHUNK_SNAP_TOKENS = 200
+
+# Pomijanie niemal identycznych chunków (powtórki, odczytywane na głos teksty):
+# podobieństwo Jaccarda 5-gramów słów względem wcześniejszych chunków
+DEDUP = os.environ.get("DEDUP", "0") == "1"
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.85"))
 
 PART_MAX = int(os.environ.get("PART_MAX", "500"))
 FINAL_MAX = int(os.environ.get("FINAL_MAX", "900"))
@@ -39,15 +78,47 @@ TIMEOUT_SEC = int(os.environ.get("TIMEOUT_SEC", "600"))
 RETRIES = int(os.environ.get("RETRIES", "4"))
 BACKOFF_BASE = float(os.environ.get("BACKOFF_BASE", "1.5"))
 
+# Ile utrzymywanych (keep-alive) połączeń do LM Studio trzymamy w puli
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "32"))
+
+# Odpowiedzi LLM jako strumień SSE ("stream": true)
+LLM_STREAM = os.environ.get("LLM_STREAM", "1") != "0"
+
+# Batch API (/v1/batches, np. vLLM / OpenAI) dla podsumowań części i redukcji.
+# LM Studio go nie ma, więc domyślnie wyłączone; przy błędzie -> zapytania równoległe
+LLM_BATCH = os.environ.get("LLM_BATCH", "0") == "1"
+BATCH_POLL_SEC = float(os.environ.get("BATCH_POLL_SEC", "5"))
+BATCH_TIMEOUT_SEC = int(os.environ.get("BATCH_TIMEOUT_SEC", "3600"))
+
+# Cache podsumowań części / redukcji na dysku (klucz = model + prompt + parametry)
+CACHE_DIR = Path(os.environ.get("CACHE_DIR", str(Path.home() / ".cache" / "meeting_app")))
+SUMMARY_CACHE = os.environ.get("SUMMARY_CACHE", "1") != "0"
+# podbij przy zmianie szablonów promptów, żeby unieważnić stary cache
+PROMPT_VERSION = "1"
+
+# Lista modeli z /v1/models trzymana w CACHE_DIR/models.json przez tyle sekund
+MODELS_CACHE_TTL = int(os.environ.get("MODELS_CACHE_TTL", "300"))
+
+# Ile zapytań do LM Studio może być w locie jednocześnie
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "4"))
+
 SUPPORTED_AUDIO = {".wav", ".mp3", ".m4a", ".aac", ".flac", ".ogg"}
 SUPPORTED_VIDEO = {".mp4", ".mov", ".mkv", ".webm"}
 
 PL_CHARS = set("ąćęłńóśżźĄĆĘŁŃÓŚŻŹ")
+# tablica dla str.translate: usuwa polskie znaki (liczenie w C zamiast pętli w Pythonie)
+PL_DEL = str.maketrans("", "", "".join(PL_CHARS))
+
+_PL_WORDS_RE = re.compile(r"\b(i|że|nie|się|jest|dla|z|na|do|w|oraz|tak|tego|też|czy|jak)\b", re.IGNORECASE)
+_EN_WORDS_RE = re.compile(r"\b(the|and|to|of|in|is|for|we|you|that|it|with|this|are)\b", re.IGNORECASE)
 
 
 # =========================
 # NARZĘDZIA
 # =========================
+_MLX_WHISPER = None
+
+
 def die(msg, code=1):
     print(f"\n[BŁĄD] {msg}")
     sys.exit(code)
@@ -61,6 +132,17 @@ def run_cmd(cmd):
     return p.stdout
 
 
+def run_cmd_quiet(cmd):
+    """
+    Jak run_cmd, ale bez buforowania wyjścia (ffmpeg / mlx_whisper są gadatliwe):
+    stdout -> /dev/null, stderr dekodujemy tylko przy błędzie.
+    """
+    p = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if p.returncode != 0:
+        print(p.stderr.decode("utf-8", errors="ignore"))
+        raise RuntimeError(f"Command failed: {cmd[0]}")
+
+
 def ensure_tool(name):
     try:
         run_cmd([name, "-version"])
@@ -68,20 +150,86 @@ def ensure_tool(name):
         die(f"Nie widzę narzędzia '{name}'. Zainstaluj je i spróbuj ponownie.")
 
 
+def _mlx_whisper():
+    """
+    Moduł mlx_whisper albo None (np. meeting-app zainstalowany poza venv
+    z mlx-whisper -> tylko CLI). Import dopiero przy pierwszym użyciu:
+    ciągnie mlx / numpy / huggingface_hub, a --help go nie potrzebuje.
+    """
+    global _MLX_WHISPER
+    if _MLX_WHISPER is None:
+        try:
+            import mlx_whisper
+            _MLX_WHISPER = mlx_whisper
+        except ImportError:
+            _MLX_WHISPER = False
+    return _MLX_WHISPER or None
+
+
 def ensure_mlx_whisper():
+    # API w procesie wystarczy, CLI jest tylko zapasem
+    if _mlx_whisper() is not None:
+        return
     try:
         run_cmd(["mlx_whisper", "--help"])
     except Exception:
         die("Nie widzę komendy 'mlx_whisper'. Upewnij się, że masz aktywne venv i zainstalowany mlx-whisper.")
 
 
-def get_models():
+def _models_cache_file():
+    return CACHE_DIR / "models.json"
+
+
+def load_models_cache():
+    """
+    Lista modeli z cache, jeśli jest świeża (MODELS_CACHE_TTL) i dotyczy
+    tego samego LMSTUDIO_BASE; inaczej None.
+    """
+    path = _models_cache_file()
+    try:
+        data = json.loads(read_text_utf8(path))
+    except (OSError, ValueError):
+        return None
+    if data.get("base") != LMSTUDIO_BASE or time.time() - data.get("ts", 0) > MODELS_CACHE_TTL:
+        return None
+    return data.get("models")
+
+
+def save_models_cache(models):
+    path = _models_cache_file()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"models.{os.getpid()}.tmp")
+        write_text_utf8(tmp, json.dumps({"base": LMSTUDIO_BASE, "ts": time.time(), "models": models}))
+        tmp.replace(path)
+    except OSError:
+        pass
+
+
+def invalidate_models_cache():
+    try:
+        _models_cache_file().unlink()
+    except FileNotFoundError:
+        pass
+
+
+def get_models(required=()):
+    """
+    Lista modeli LM Studio; z cache (models.json) tylko wtedy, gdy zawiera
+    wszystkie modele z `required` - inaczej cache jest kasowany i pytamy serwer.
+    """
+    models = load_models_cache()
+    if models and all(m in models for m in required):
+        return models
+    invalidate_models_cache()
     try:
         with urllib.request.urlopen(f"{LMSTUDIO_BASE}/v1/models", timeout=20) as resp:
             data = json.loads(resp.read().decode("utf-8"))
-        return [m["id"] for m in data.get("data", [])]
+        models = [m["id"] for m in data.get("data", [])]
     except Exception as e:
         die(f"Nie mogę połączyć się z LM Studio Local Server. Szczegóły: {e}")
+    save_models_cache(models)
+    return models
 
 
 def require_model_exists(model_id, models):
@@ -108,7 +256,8 @@ def choose_from_list(title, options, default=None):
 
 
 def read_text_utf8(path: Path) -> str:
-    return path.read_text(encoding="utf-8", errors="ignore")
+    # jedno dekodowanie całego bufora zamiast strumienia przez TextIOWrapper
+    return path.read_bytes().decode("utf-8", errors="ignore")
 
 
 def write_text_utf8(path: Path, text: str):
@@ -118,24 +267,113 @@ def write_text_utf8(path: Path, text: str):
 # =========================
 # LLM (LM Studio OpenAI-compatible)
 # =========================
+_CONN_POOL = queue.LifoQueue()
+
+
+def _new_conn():
+    u = urllib.parse.urlsplit(LMSTUDIO_BASE)
+    conn_cls = http.client.HTTPSConnection if u.scheme == "https" else http.client.HTTPConnection
+    return conn_cls(u.hostname, u.port, timeout=TIMEOUT_SEC)
+
+
+def _release_conn(conn):
+    if _CONN_POOL.qsize() < HTTP_POOL_MAXSIZE:
+        _CONN_POOL.put(conn)
+    else:
+        conn.close()
+
+
+@contextmanager
+def _open_chat(payload, accept="application/json"):
+    """
+    POST /v1/chat/completions po połączeniu z puli (keep-alive),
+    zamiast nowego połączenia TCP na każde zapytanie.
+    - połączenie z puli zamknięte w międzyczasie przez serwer -> bierzemy kolejne / nowe
+    - HTTP >= 400 zgłaszamy jako urllib.error.HTTPError (jak wcześniej urlopen)
+    """
+    u = urllib.parse.urlsplit(LMSTUDIO_BASE)
+    path = u.path.rstrip("/") + "/v1/chat/completions"
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json", "Accept": accept}
+
+    while True:
+        try:
+            conn, reused = _CONN_POOL.get_nowait(), True
+        except queue.Empty:
+            conn, reused = _new_conn(), False
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            resp = conn.getresponse()
+            break
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+    keep = False
+    try:
+        if resp.status >= 400:
+            raise urllib.error.HTTPError(
+                f"{LMSTUDIO_BASE}/v1/chat/completions", resp.status, resp.reason, resp.headers,
+                io.BytesIO(resp.read())
+            )
+        yield resp
+        # doczytujemy resztę, żeby połączenie nadawało się do ponownego użycia
+        resp.read()
+        keep = not resp.will_close
+    finally:
+        if keep:
+            _release_conn(conn)
+        else:
+            conn.close()
+
+
 def _post_chat(payload):
-    url = f"{LMSTUDIO_BASE}/v1/chat/completions"
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    with urllib.request.urlopen(req, timeout=TIMEOUT_SEC) as resp:
+    with _open_chat(payload) as resp:
         return json.loads(resp.read().decode("utf-8"))
 
 
+def _post_chat_stream(payload):
+    """
+    Jak _post_chat, ale z "stream": true - skleja delty z kolejnych
+    zdarzeń SSE (data: {...}) aż do znacznika [DONE].
+    """
+    parts = []
+    with _open_chat({**payload, "stream": True}, accept="text/event-stream") as resp:
+        # serwer zignorował stream -> zwykła odpowiedź JSON
+        if not resp.headers.get("Content-Type", "").startswith("text/event-stream"):
+            out = json.loads(resp.read().decode("utf-8"))
+            return out["choices"][0]["message"]["content"]
+
+        for raw in resp:
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if not line.startswith("data:"):
+                continue
+            event = line[len("data:"):].strip()
+            if event == "[DONE]":
+                break
+            chunk = json.loads(event)
+            if "error" in chunk:
+                raise RuntimeError(f"LM Studio stream error: {chunk['error']}")
+            choices = chunk.get("choices") or []
+            if choices:
+                content = (choices[0].get("delta") or {}).get("content")
+                if content:
+                    parts.append(content)
+    return "".join(parts)
+
+
 def call_llm(model_id, messages, max_tokens=600, temperature=0.2):
     """
     Odporne wywołanie LM Studio:
     - retry + backoff na 429 / 500 / 503 / 504
     - pokazuje body HTTP error (łatwy debug)
+    - domyślnie odbiera odpowiedź strumieniowo (LLM_STREAM=0 wyłącza)
+    - błąd "brak modelu": ponowne /v1/models (z pominięciem models.json);
+      jeśli modelu faktycznie nie ma - kończymy tym samym komunikatem co na starcie
     """
     payload = {
         "model": model_id,
@@ -146,6 +384,8 @@ def call_llm(model_id, messages, max_tokens=600, temperature=0.2):
 
     for attempt in range(1, RETRIES + 1):
         try:
+            if LLM_STREAM:
+                return _post_chat_stream(payload)
             out = _post_chat(payload)
             return out["choices"][0]["message"]["content"]
         except urllib.error.HTTPError as e:
@@ -155,6 +395,11 @@ def call_llm(model_id, messages, max_tokens=600, temperature=0.2):
                 print(f"[LLM] HTTP {e.code}, ponawiam za {sleep_s:.1f}s...")
                 time.sleep(sleep_s)
                 continue
+            if e.code == 404 or (e.code == 400 and "model" in body.lower()):
+                # model zniknął z LM Studio -> lista modeli w cache jest nieaktualna;
+                # die() w wątku puli wraca do main przez fut.result() jako SystemExit
+                invalidate_models_cache()
+                require_model_exists(model_id, get_models(required=(model_id,)))
             raise RuntimeError(f"LM Studio HTTP {e.code}: {body}") from e
         except Exception as e:
             if attempt < RETRIES:
@@ -165,17 +410,232 @@ def call_llm(model_id, messages, max_tokens=600, temperature=0.2):
             raise RuntimeError(f"LM Studio error: {e}") from e
 
 
+def _summary_cache_key(model_id, messages, max_tokens, temperature):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps(
+        [PROMPT_VERSION, model_id, messages, max_tokens, temperature],
+        ensure_ascii=False
+    ).encode("utf-8"))
+    return h.hexdigest()
+
+
+def cache_get(key):
+    # błąd odczytu cache = brak wpisu (podsumowanie po prostu policzymy)
+    try:
+        return read_text_utf8(CACHE_DIR / "summaries" / f"{key}.txt")
+    except OSError:
+        return None
+
+
+def cache_put(key, text):
+    cache_dir = CACHE_DIR / "summaries"
+    # zapis przez plik tymczasowy, żeby przerwany run nie zostawił uciętego wpisu;
+    # unikalna nazwa, bo ten sam klucz mogą zapisywać równocześnie dwa wątki
+    tmp = cache_dir / f"{key}.{uuid.uuid4().hex}.tmp"
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        write_text_utf8(tmp, text)
+        tmp.replace(cache_dir / f"{key}.txt")
+    except OSError as e:
+        print(f"[WARN] Nie udało się zapisać cache podsumowania: {e}")
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+    return text
+
+
+def call_llm_cached(model_id, messages, max_tokens=600, temperature=0.2):
+    """
+    call_llm z cache na dysku (CACHE_DIR/summaries).
+    Ponowne uruchomienie na tej samej transkrypcji nie odpytuje już LM Studio.
+    """
+    if not SUMMARY_CACHE:
+        return call_llm(model_id, messages, max_tokens, temperature)
+    key = _summary_cache_key(model_id, messages, max_tokens, temperature)
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+    return cache_put(key, call_llm(model_id, messages, max_tokens, temperature))
+
+
+def _api_request(method, path, data=None, content_type="application/json"):
+    req = urllib.request.Request(
+        f"{LMSTUDIO_BASE}{path}",
+        data=data,
+        headers={"Content-Type": content_type} if data is not None else {},
+        method=method,
+    )
+    with urllib.request.urlopen(req, timeout=TIMEOUT_SEC) as resp:
+        return resp.read()
+
+
+def _upload_batch_file(jsonl):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="purpose"\r\n\r\nbatch\r\n'
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="prompts.jsonl"\r\n'
+        f"Content-Type: application/jsonl\r\n\r\n"
+    ).encode("utf-8") + jsonl + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    out = _api_request("POST", "/v1/files", body, f"multipart/form-data; boundary={boundary}")
+    return json.loads(out.decode("utf-8"))["id"]
+
+
+def batch_chat(model_id, messages_list, max_tokens=600, temperature=0.2):
+    """
+    Wszystkie zapytania w jednym zadaniu Batch API (OpenAI-compatible):
+    - upload JSONL (/v1/files), utworzenie batcha (/v1/batches)
+    - polling statusu co BATCH_POLL_SEC (max BATCH_TIMEOUT_SEC)
+    - pobranie wyników i ułożenie ich wg custom_id
+    """
+    lines = [
+        json.dumps({
+            "custom_id": f"g{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model_id,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            },
+        }, ensure_ascii=False)
+        for i, messages in enumerate(messages_list)
+    ]
+    file_id = _upload_batch_file("\n".join(lines).encode("utf-8"))
+    batch = json.loads(_api_request("POST", "/v1/batches", json.dumps({
+        "input_file_id": file_id,
+        "endpoint": "/v1/chat/completions",
+        "completion_window": "24h",
+    }).encode("utf-8")).decode("utf-8"))
+
+    deadline = time.monotonic() + BATCH_TIMEOUT_SEC
+    while batch["status"] not in ("completed", "failed", "expired", "cancelled"):
+        if time.monotonic() > deadline:
+            _api_request("POST", f"/v1/batches/{batch['id']}/cancel", b"{}")
+            raise RuntimeError(f"Batch {batch['id']} nie skończył się w {BATCH_TIMEOUT_SEC}s")
+        time.sleep(BATCH_POLL_SEC)
+        batch = json.loads(_api_request("GET", f"/v1/batches/{batch['id']}").decode("utf-8"))
+
+    if batch["status"] != "completed" or not batch.get("output_file_id"):
+        raise RuntimeError(f"Batch {batch['id']} zakończony ze statusem {batch['status']}")
+
+    results = [None] * len(messages_list)
+    out = _api_request("GET", f"/v1/files/{batch['output_file_id']}/content")
+    for line in out.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        resp = item.get("response") or {}
+        if item.get("error") or resp.get("status_code") != 200:
+            raise RuntimeError(f"Batch: błąd dla {item.get('custom_id')}: {item.get('error') or resp}")
+        results[int(item["custom_id"][1:])] = resp["body"]["choices"][0]["message"]["content"]
+
+    if any(r is None for r in results):
+        raise RuntimeError("Batch: brak części wyników")
+    return results
+
+
+def batch_chat_cached(model_id, messages_list, max_tokens=600, temperature=0.2):
+    """
+    batch_chat tylko dla zapytań, których nie ma w cache podsumowań.
+    """
+    keys = [_summary_cache_key(model_id, m, max_tokens, temperature) for m in messages_list]
+    results = [cache_get(k) if SUMMARY_CACHE else None for k in keys]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        fresh = batch_chat(model_id, [messages_list[i] for i in missing], max_tokens, temperature)
+        for i, text in zip(missing, fresh):
+            results[i] = cache_put(keys[i], text) if SUMMARY_CACHE else text
+    return results
+
+
+def load_checkpoint(path: Path):
+    """
+    Ukończone zapytania z pliku JSONL ({"i", "key", "text"} w linii) -> {i: (key, text)}.
+    Ucięta ostatnia linia (przerwany zapis) jest pomijana.
+    """
+    done = {}
+    if not path.exists():
+        return done
+    for line in read_text_utf8(path).splitlines():
+        try:
+            item = json.loads(line)
+            done[item["i"]] = (item["key"], item["text"])
+        except (ValueError, KeyError):
+            continue
+    return done
+
+
+def call_llm_many(model_id, messages_iter, max_tokens=600, temperature=0.2, desc=None, total=None, checkpoint=None):
+    """
+    Równoległe wywołania call_llm_cached (max LLM_CONCURRENCY naraz).
+    - zapytania są I/O-bound (czekamy na LM Studio), więc wystarczą wątki
+    - messages_iter może być generatorem: zapytania startują w trakcie iteracji,
+      a kolejne elementy pobieramy dopiero, gdy w kolejce jest mniej niż
+      2 * LLM_CONCURRENCY zapytań (nie trzymamy całego wejścia w pamięci)
+    - wyniki w tej samej kolejności co wejście
+    - checkpoint (plik JSONL): każdy gotowy wynik jest dopisywany od razu,
+      a przy wznowieniu pozycje z pasującym kluczem nie są wysyłane ponownie
+    - przy LLM_BATCH=1 najpierw próbuje Batch API (batch_chat)
+    """
+    if LLM_BATCH:
+        messages_iter = list(messages_iter)
+        if messages_iter:
+            try:
+                return batch_chat_cached(model_id, messages_iter, max_tokens, temperature)
+            except Exception as e:
+                print(f"[LLM] Batch API niedostępne ({e}) – wysyłam zapytania równolegle.")
+
+    done = load_checkpoint(checkpoint) if checkpoint else {}
+    lock = threading.Lock()
+
+    def save(fut, i, key):
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        with lock, checkpoint.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"i": i, "key": key, "text": fut.result()}, ensure_ascii=False) + "\n")
+
+    from tqdm import tqdm
+
+    workers = max(1, LLM_CONCURRENCY)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    # submit nie blokuje - bez limitu generator zostałby zjedzony od razu
+    slots = threading.BoundedSemaphore(2 * workers)
+    bar = tqdm(total=total, desc=desc, disable=desc is None)
+    try:
+        futures = []
+        for i, messages in enumerate(messages_iter):
+            key = _summary_cache_key(model_id, messages, max_tokens, temperature) if checkpoint else None
+            if checkpoint and i in done and done[i][0] == key:
+                fut = Future()
+                fut.set_result(done[i][1])
+            else:
+                slots.acquire()
+                fut = pool.submit(call_llm_cached, model_id, messages, max_tokens, temperature)
+                fut.add_done_callback(lambda _: slots.release())
+                if checkpoint:
+                    fut.add_done_callback(lambda f, i=i, key=key: save(f, i, key))
+            fut.add_done_callback(lambda _: bar.update(1))
+            futures.append(fut)
+        bar.total = len(futures)
+        bar.refresh()
+        return [fut.result() for fut in futures]
+    finally:
+        # przy błędzie nie czekamy na zapytania, które jeszcze nie wystartowały
+        pool.shutdown(wait=True, cancel_futures=True)
+        bar.close()
+
+
 # =========================
 # JĘZYK (prosta heurystyka EN/PL)
 # =========================
 def detect_lang_from_text(sample):
-    pl_char_hits = sum(1 for c in sample if c in PL_CHARS)
-    pl_words = len(
-        re.findall(r"\b(i|że|nie|się|jest|dla|z|na|do|w|oraz|tak|tego|też|czy|jak)\b", sample.lower())
-    )
-    en_words = len(
-        re.findall(r"\b(the|and|to|of|in|is|for|we|you|that|it|with|this|are)\b", sample.lower())
-    )
+    pl_char_hits = len(sample) - len(sample.translate(PL_DEL))
+    pl_words = len(_PL_WORDS_RE.findall(sample))
+    en_words = len(_EN_WORDS_RE.findall(sample))
     score_pl = pl_char_hits * 2 + pl_words
     return "pl" if score_pl >= max(2, en_words) else "en"
 
@@ -184,15 +644,52 @@ def detect_lang_from_text(sample):
 # AUDIO
 # =========================
 def extract_audio(in_path, out_wav):
-    run_cmd([
+    run_cmd_quiet([
         "ffmpeg", "-y", "-i", str(in_path),
         "-vn", "-ac", "1", "-ar", "16000",
         "-c:a", "pcm_s16le", str(out_wav)
     ])
 
 
+def wav_duration(wav_path: Path) -> float:
+    with wave.open(str(wav_path), "rb") as w:
+        return w.getnframes() / float(w.getframerate())
+
+
+def split_audio_chunks(wav_path: Path, out_dir: Path, chunk_s, overlap_s=1):
+    """
+    Tnie WAV na kawałki po chunk_s sekund, każdy dłuższy o overlap_s
+    (zakładka pozwala potem skleić tekst bez uciętych słów).
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    duration = wav_duration(wav_path)
+    chunks = []
+    for i, t in enumerate(range(0, math.ceil(duration), chunk_s)):
+        chunk_wav = out_dir / f"chunk_{i:03d}.wav"
+        run_cmd_quiet([
+            "ffmpeg", "-y", "-ss", str(t), "-t", str(chunk_s + overlap_s),
+            "-i", str(wav_path), "-c", "copy", str(chunk_wav)
+        ])
+        chunks.append(chunk_wav)
+    return chunks
+
+
+def load_wav_sample(wav_path: Path, seconds=60, start=0):
+    """
+    `seconds` sekund audio.wav od `start` (16 kHz, mono, s16le) jako float32 dla Whispera.
+    """
+    import numpy as np
+
+    with wave.open(str(wav_path), "rb") as w:
+        if w.getframerate() != 16000 or w.getnchannels() != 1 or w.getsampwidth() != 2:
+            raise ValueError("audio.wav musi być 16 kHz / mono / 16-bit")
+        w.setpos(min(int(start * w.getframerate()), w.getnframes()))
+        frames = w.readframes(int(seconds * w.getframerate()))
+    return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+
+
 def extract_audio_sample(in_wav, out_wav, seconds=60):
-    run_cmd([
+    run_cmd_quiet([
         "ffmpeg", "-y", "-i", str(in_wav),
         "-t", str(seconds),
         "-ac", "1", "-ar", "16000",
@@ -213,7 +710,180 @@ def whisper_transcribe(wav_path: Path, out_dir: Path, lang: str | None):
     ]
     if lang:
         cmd += ["--language", lang]
-    run_cmd(cmd)
+    run_cmd_quiet(cmd)
+
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def _norm_token(token):
+    return re.sub(r"[^\w]", "", token.lower())
+
+
+def split_tail_words(text, n):
+    """
+    (text bez ostatnich n słów, ostatnie n słów) - z oryginalnymi odstępami
+    i końcami linii, więc "".join(...) daje z powrotem text.
+    """
+    starts = [m.start() for m in _WORD_RE.finditer(text)]
+    if len(starts) <= n:
+        return "", text
+    cut = starts[-n] if n else len(text)
+    return text[:cut], text[cut:]
+
+
+def merge_overlap(prev_text, next_text, window, slack=3, min_match=3):
+    """
+    Skleja transkrypcje sąsiednich kawałków audio:
+    - szukamy wspólnego ciągu słów, który jest końcem prev i początkiem next
+      (z tolerancją `slack` słów na przekłamania Whispera na granicy kawałka)
+    - zostawiamy prev do końca dopasowania i next od końca dopasowania
+    Wspólne frazy ze środka okna ("in the", "the budget for") nie są brane
+    pod uwagę - bez zakotwiczonego dopasowania (min `min_match` słów)
+    doklejamy next w nowej linii, nic nie usuwając.
+    Tekst poza zdublowanymi słowami zostaje bez zmian (łącznie z końcami linii).
+    """
+    prev_words = list(_WORD_RE.finditer(prev_text))
+    next_words = list(_WORD_RE.finditer(next_text))
+    if not prev_words or not next_words:
+        return prev_text + next_text
+
+    tail_start = max(0, len(prev_words) - window)
+    tail = [_norm_token(m.group()) for m in prev_words[tail_start:]]
+    head = [_norm_token(m.group()) for m in next_words[:window]]
+
+    best = None
+    for m in difflib.SequenceMatcher(None, tail, head, autojunk=False).get_matching_blocks():
+        anchored = m.a + m.size >= len(tail) - slack and m.b <= slack
+        if m.size >= min_match and anchored and (best is None or m.size > best.size):
+            best = m
+    if best is None:
+        return prev_text.rstrip() + "\n" + next_text.lstrip()
+
+    prev_end = prev_words[tail_start + best.a + best.size - 1].end()
+    next_start = next_words[best.b + best.size - 1].end()
+    return prev_text[:prev_end] + next_text[next_start:]
+
+
+def whisper_transcribe_py(audio, lang: str | None) -> str:
+    """
+    Transkrypcja przez API mlx_whisper w bieżącym procesie: model zostaje
+    w pamięci (np. po wykrywaniu języka), bez pliku .txt pośrodku.
+    audio = ścieżka albo próbki float32 (load_wav_sample).
+    Tekst jak w wyjściu txt CLI: jeden segment na linię.
+    """
+    result = _mlx_whisper().transcribe(
+        str(audio) if isinstance(audio, Path) else audio,
+        path_or_hf_repo=WHISPER_MODEL,
+        language=lang,
+        verbose=None,
+    )
+    segments = result.get("segments") or []
+    if segments:
+        return "\n".join(seg["text"].strip() for seg in segments)
+    return result.get("text", "").strip()
+
+
+def whisper_transcribe_slice(wav_path: Path, start, seconds, lang: str | None) -> str:
+    # kawałek czytany prosto z audio.wav - bez plików chunk_*.wav i ffmpeg
+    return whisper_transcribe_py(load_wav_sample(wav_path, seconds, start), lang)
+
+
+def whisper_transcribe_chunk(chunk_wav: Path, lang: str | None) -> str:
+    whisper_transcribe(chunk_wav, chunk_wav.parent, lang)
+    return read_text_utf8(chunk_wav.with_suffix(".txt"))
+
+
+def _iter_in_order(pool, jobs, desc):
+    """
+    Uruchamia jobs (lista (fn, args)) w puli i zwraca wyniki w kolejności jobs,
+    każdy gdy tylko gotowe są wszystkie poprzednie.
+    """
+    from tqdm import tqdm
+
+    futures = {pool.submit(fn, *args): i for i, (fn, args) in enumerate(jobs)}
+    ready = {}
+    next_i = 0
+    for fut in tqdm(as_completed(futures), total=len(futures), desc=desc):
+        ready[futures[fut]] = fut.result()
+        while next_i in ready:
+            yield ready.pop(next_i)
+            next_i += 1
+
+
+def iter_transcribe(wav_path: Path, out_dir: Path, lang: str | None):
+    """
+    Pełna transkrypcja nagrania jako strumień kolejnych fragmentów tekstu
+    (fragment jest zwracany, gdy tylko gotowe są wszystkie kawałki audio przed nim).
+    - API mlx_whisper: ~WHISPER_PIECES_PER_WORKER kawałków (min WHISPER_CHUNK_SEC)
+      na każdy z WHISPER_WORKERS procesów (model ładowany raz na proces);
+      przy jednym workerze - w tym procesie
+    - CLI: jeden kawałek na workera (min WHISPER_MIN_CHUNK_SEC)
+    Krótkie nagrania - jednym wywołaniem.
+    """
+    duration = wav_duration(wav_path)
+    use_api = _mlx_whisper() is not None
+    if use_api:
+        # godzina przy 4 workerach: 32 kawałki po ~2 min zamiast ~100 po 35 s
+        max_pieces = max(1, WHISPER_WORKERS) * max(1, WHISPER_PIECES_PER_WORKER)
+        chunk_s = max(WHISPER_CHUNK_SEC, math.ceil(duration / max_pieces), 1)
+    else:
+        chunk_s = max(WHISPER_MIN_CHUNK_SEC, math.ceil(duration / max(1, WHISPER_WORKERS)), 1)
+    pieces = math.ceil(duration / chunk_s)
+    if pieces <= 1 or (not use_api and WHISPER_WORKERS <= 1):
+        if use_api:
+            yield whisper_transcribe_py(wav_path, lang)
+            return
+        whisper_transcribe(wav_path, out_dir, lang=lang)
+        yield read_text_utf8(find_biggest_txt(out_dir))
+        return
+
+    # ~3 słowa/s mowy; okno z zapasem, bo granice kawałków Whisper rozpoznaje niedokładnie
+    window = max(10, WHISPER_OVERLAP_SEC * 3 * 2)
+    # dopasowanie musi kończyć prev / zaczynać next z dokładnością do ~1 s mowy
+    slack = max(3, WHISPER_OVERLAP_SEC * 2)
+    # ostatnie `window` słów wstrzymujemy - merge_overlap może je jeszcze uciąć
+    tail = None
+    chunks_dir = out_dir / "chunks"
+    desc = "Transkrypcja (kawałki audio)"
+    pool = None
+    try:
+        if use_api and WHISPER_WORKERS <= 1:
+            # jeden worker: po kolei w tym procesie, z modelem już w pamięci
+            from tqdm import tqdm
+
+            texts = (
+                whisper_transcribe_slice(wav_path, i * chunk_s, chunk_s + WHISPER_OVERLAP_SEC, lang)
+                for i in tqdm(range(pieces), desc=desc)
+            )
+        elif use_api:
+            pool = ProcessPoolExecutor(max_workers=min(WHISPER_WORKERS, pieces))
+            jobs = [
+                (whisper_transcribe_slice, (wav_path, i * chunk_s, chunk_s + WHISPER_OVERLAP_SEC, lang))
+                for i in range(pieces)
+            ]
+            texts = _iter_in_order(pool, jobs, desc)
+        else:
+            # CLI: wątki tylko czekają na podprocesy mlx_whisper
+            chunks = split_audio_chunks(wav_path, chunks_dir, chunk_s, WHISPER_OVERLAP_SEC)
+            pool = ThreadPoolExecutor(max_workers=len(chunks))
+            texts = _iter_in_order(pool, [(whisper_transcribe_chunk, (c, lang)) for c in chunks], desc)
+
+        for text in texts:
+            merged = text if tail is None else merge_overlap(tail, text, window, slack)
+            head, tail = split_tail_words(merged, window)
+            if head:
+                yield head
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(chunks_dir, ignore_errors=True)
+    if tail:
+        yield tail
+
+
+def transcribe_full(wav_path: Path, out_dir: Path, lang: str | None) -> str:
+    return "".join(iter_transcribe(wav_path, out_dir, lang))
 
 
 def find_txts(out_dir: Path):
@@ -242,16 +912,169 @@ def cleanup_sample_files(out_dir: Path):
             pass
 
 
+def detect_language_fast(wav_path: Path, seconds=60):
+    """
+    Wykrycie języka w tym samym procesie: próbka ładowana prosto z audio.wav
+    (bez sample.wav i drugiego ffmpeg), Whisper przez API mlx_whisper.
+    Zwraca None, jeśli API nie jest dostępne.
+    """
+    if _mlx_whisper() is None:
+        return None
+    result = _mlx_whisper().transcribe(
+        load_wav_sample(wav_path, seconds),
+        path_or_hf_repo=WHISPER_MODEL,
+        verbose=None,
+    )
+    lang = result.get("language")
+    if lang in ("pl", "en"):
+        return lang
+    return detect_lang_from_text(result.get("text", ""))
+
+
+def detect_language_cli(wav_path: Path, out_dir: Path, seconds=60):
+    sample_wav = out_dir / "sample.wav"
+    extract_audio_sample(wav_path, sample_wav, seconds=seconds)
+
+    whisper_transcribe(sample_wav, out_dir, lang=None)
+
+    sample_txt = find_biggest_txt(out_dir)
+    lang = detect_lang_from_text(read_text_utf8(sample_txt))
+
+    # kasujemy sample + txt po próbce, żeby nie mieszać z pełną transkrypcją
+    cleanup_sample_files(out_dir)
+    return lang
+
+
 # =========================
 # PODSUMOWANIE
 # =========================
-def chunk_text(text, size):
-    return [text[i:i + size] for i in range(0, len(text), size)]
+_SENTENCE_END_RE = re.compile(r"[.!?…](?=\s)|\n")
+_ENCODING = None
 
 
-def summarize_parts(model_id, text, chunk_size, lang):
-    parts = chunk_text(text, chunk_size)
-    summaries = []
+def _get_encoding():
+    global _ENCODING
+    if _ENCODING is None:
+        try:
+            import tiktoken
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            # opcjonalne: bez tiktoken liczymy tokeny szacunkowo
+            _ENCODING = False
+        except Exception:
+            # np. brak sieci przy pierwszym pobraniu słownika BPE
+            _ENCODING = False
+    return _ENCODING or None
+
+
+def _token_offsets(text):
+    """
+    Indeksy znaków, od których zaczynają się kolejne tokeny tekstu.
+    """
+    enc = _get_encoding()
+    if enc is None:
+        return [int(i * CHARS_PER_TOKEN) for i in range(math.ceil(len(text) / CHARS_PER_TOKEN))]
+    _, offsets = enc.decode_with_offsets(enc.encode(text, disallowed_special=()))
+    return offsets
+
+
+def _last_sentence_end(text, lo, hi):
+    end = None
+    for m in _SENTENCE_END_RE.finditer(text, lo, hi):
+        end = m.end()
+    return end
+
+
+def _cut_chunk(buf, max_tokens, overlap):
+    """
+    Pierwszy chunk z bufora (max_tokens tokenów, koniec dociągnięty do końca
+    zdania w ostatnich CHUNK_SNAP_TOKENS tokenach) i indeks znaku, od którego
+    zaczyna się następny (overlap tokenów przed końcem).
+    None, jeśli w buforze nie ma jeszcze więcej niż max_tokens tokenów.
+    """
+    offsets = _token_offsets(buf)
+    if len(offsets) <= max_tokens:
+        return None
+
+    end = offsets[max_tokens]
+    snap_from = offsets[max(1, max_tokens - CHUNK_SNAP_TOKENS)]
+    end = _last_sentence_end(buf, snap_from, end) or end
+
+    end_tok = bisect.bisect_left(offsets, end)
+    return buf[:end], offsets[max(1, end_tok - overlap)]
+
+
+def iter_chunks(blocks, max_tokens, overlap=0):
+    """
+    Dzieli strumień bloków tekstu na chunki po max_tokens tokenów
+    (z zakładką overlap tokenów). W pamięci trzymamy tylko bieżący bufor
+    (~1-2 chunki), nie całą transkrypcję.
+    """
+    max_tokens = max(1, max_tokens)
+    overlap = max(0, min(overlap, max_tokens // 2))
+    buf = ""
+    for block in blocks:
+        buf += block
+        while (cut := _cut_chunk(buf, max_tokens, overlap)) is not None:
+            chunk, next_start = cut
+            yield chunk
+            buf = buf[next_start:]
+    if buf:
+        yield buf
+
+
+def _shingles(text, n=5):
+    words = text.lower().split()
+    if len(words) <= n:
+        return {hash(tuple(words))}
+    return {hash(tuple(words[i:i + n])) for i in range(len(words) - n + 1)}
+
+
+def dedup_chunks(chunks, threshold):
+    """
+    Przepuszcza chunki, pomijając te, których zbiór 5-gramów ma podobieństwo
+    Jaccarda >= threshold z którymś z wcześniej przepuszczonych.
+    Porównanie dokładne (bez MinHash) - przy kilkudziesięciu chunkach to ułamki sekundy.
+    """
+    seen = []
+    skipped = 0
+    for chunk in chunks:
+        sh = _shingles(chunk)
+        if any(len(sh & prev) >= threshold * len(sh | prev) for prev in seen):
+            skipped += 1
+            continue
+        seen.append(sh)
+        yield chunk
+    if skipped:
+        print(f"[DEDUP] Pominięto {skipped} powtarzających się fragmentów transkrypcji.")
+
+
+def iter_text_blocks(path: Path, block_chars):
+    with path.open("r", encoding="utf-8", errors="ignore") as f:
+        while block := f.read(block_chars):
+            yield block
+
+
+def iter_transcript_chunks(path: Path):
+    """
+    Chunki transkrypcji czytanej z pliku blokami (~jeden chunk na blok).
+    Zwraca (generator chunków, szacowana liczba chunków dla paska postępu).
+    """
+    chunk_chars = int(CHUNK_TOKENS * CHARS_PER_TOKEN)
+    stride_chars = max(1, int((CHUNK_TOKENS - CHUNK_OVERLAP_TOKENS) * CHARS_PER_TOKEN))
+    total = max(1, math.ceil(path.stat().st_size / stride_chars))
+    chunks = iter_chunks(iter_text_blocks(path, chunk_chars), CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+    return chunks, total
+
+
+def summarize_parts(model_id, parts, lang, total=None, checkpoint=None):
+    """
+    Podsumowania kolejnych chunków (parts: dowolny iterowalny, np. generator
+    z iter_transcript_chunks); total = szacowana liczba chunków dla tqdm.
+    checkpoint = plik JSONL z gotowymi podsumowaniami (wznawianie przerwanego runu).
+    """
+    if DEDUP:
+        parts = dedup_chunks(parts, DEDUP_THRESHOLD)
 
     if lang == "pl":
         system_msg = "Jesteś precyzyjnym analitykiem spotkań. Odpowiadasz po polsku."
@@ -282,21 +1105,23 @@ Transcript:
 """
         bar_label = "Creating summaries (parts)"
 
-    for part in tqdm(parts, desc=bar_label):
-        prompt = user_tpl.format(part=part)
-        summaries.append(
-            call_llm(
-                model_id,
-                [
-                    {"role": "system", "content": system_msg},
-                    {"role": "user", "content": prompt},
-                ],
-                max_tokens=PART_MAX,
-                temperature=TEMP_SUMMARY
-            )
-        )
+    messages_iter = (
+        [
+            {"role": "system", "content": system_msg},
+            {"role": "user", "content": user_tpl.format(part=part)},
+        ]
+        for part in parts
+    )
 
-    return summaries
+    return call_llm_many(
+        model_id,
+        messages_iter,
+        max_tokens=PART_MAX,
+        temperature=TEMP_SUMMARY,
+        desc=bar_label,
+        total=total,
+        checkpoint=checkpoint
+    )
 
 
 def summarize_final_two_step(model_id, partial_summaries, lang):
@@ -304,7 +1129,8 @@ def summarize_final_two_step(model_id, partial_summaries, lang):
     2-step reduce:
     - łączymy po kilka części w mniejsze bloki
     - final z tych bloków
-    group_size adaptuje się do liczby części (żeby nie przekroczyć kontekstu)
+    group_size adaptuje się do liczby części (żeby nie przekroczyć kontekstu);
+    przy jednej grupie final powstaje od razu z części
     """
     if lang == "pl":
         print("Tworzenie finalnego podsumowania (2-etapowe łączenie)...")
@@ -319,8 +1145,6 @@ def summarize_final_two_step(model_id, partial_summaries, lang):
     else:
         group_size = 3
 
-    reduced = []
-
     if lang == "pl":
         reduce_system = "Jesteś precyzyjnym analitykiem spotkań. Odpowiadasz po polsku."
         reduce_user_tpl = """Połącz poniższe częściowe podsumowania w JEDNO krótkie podsumowanie.
@@ -372,18 +1196,25 @@ Summaries:
 {items}
 """
 
-    for i in range(0, n, group_size):
-        group = partial_summaries[i:i + group_size]
-        reduced_summary = call_llm(
-            model_id,
+    if n <= group_size:
+        # jedna grupa -> etap łączenia byłby tylko dodatkowym, szeregowym
+        # zapytaniem; final dostaje części bezpośrednio
+        reduced = partial_summaries
+    else:
+        # grupy są niezależne -> redukujemy je równolegle
+        reduce_messages = [
             [
                 {"role": "system", "content": reduce_system},
-                {"role": "user", "content": reduce_user_tpl.format(items=chr(10).join(group))},
-            ],
+                {"role": "user", "content": reduce_user_tpl.format(items=chr(10).join(partial_summaries[i:i + group_size]))},
+            ]
+            for i in range(0, n, group_size)
+        ]
+        reduced = call_llm_many(
+            model_id,
+            reduce_messages,
             max_tokens=PART_MAX,
             temperature=TEMP_SUMMARY
         )
-        reduced.append(reduced_summary)
 
     final_summary = call_llm(
         model_id,
@@ -398,6 +1229,54 @@ Summaries:
     return final_summary
 
 
+def summarize_chunks(model_id, chunks, summary_file: Path, lang, total=None):
+    """
+    Map-reduce z chunków transkrypcji do summary_file.
+    Podsumowania części są na bieżąco zapisywane w partials.jsonl obok
+    (przerwany run wznawia się od ostatniej gotowej części);
+    plik jest usuwany po zapisaniu finalnego podsumowania.
+    """
+    checkpoint = summary_file.parent / "partials.jsonl"
+    partial = summarize_parts(model_id, chunks, lang, total=total, checkpoint=checkpoint)
+    final_summary = summarize_final_two_step(model_id, partial, lang)
+    write_text_utf8(summary_file, final_summary)
+    try:
+        checkpoint.unlink()
+    except FileNotFoundError:
+        pass
+    return final_summary
+
+
+def summarize_transcript(model_id, transcript_file: Path, summary_file: Path, lang):
+    chunks, total = iter_transcript_chunks(transcript_file)
+    return summarize_chunks(model_id, chunks, summary_file, lang, total=total)
+
+
+def _tee_to_file(blocks, path: Path):
+    """
+    Przepuszcza bloki tekstu dalej, zapisując je po drodze do pliku.
+    Docelowy plik pojawia się dopiero po ostatnim bloku (przerwany run
+    nie zostawi uciętego transcript.txt, który wyglądałby na cache).
+    """
+    tmp = path.with_name(path.name + ".part")
+    with tmp.open("w", encoding="utf-8") as f:
+        for block in blocks:
+            f.write(block)
+            yield block
+    tmp.replace(path)
+
+
+def transcribe_and_summarize(model_id, wav_path: Path, out_dir: Path, transcript_file: Path, summary_file: Path, lang):
+    """
+    Transkrypcja i podsumowanie naraz (producent -> konsument):
+    tekst z kolejnych kawałków audio od razu trafia do chunkera,
+    a gotowe chunki do LM Studio, podczas gdy Whisper liczy dalsze kawałki.
+    """
+    blocks = _tee_to_file(iter_transcribe(wav_path, out_dir, lang), transcript_file)
+    chunks = iter_chunks(blocks, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+    return summarize_chunks(model_id, chunks, summary_file, lang)
+
+
 def translate_to_pl(model_id, text):
     prompt = f"""Przetłumacz poniższy tekst na język polski.
 Zachowaj strukturę i nie dodawaj nowych informacji.
@@ -427,11 +1306,14 @@ def main():
     ensure_tool("ffmpeg")
     ensure_mlx_whisper()
 
-    models = get_models()
+    models = get_models(required=(DEFAULT_SUMMARY_MODEL, DEFAULT_TRANSLATE_MODEL))
 
     summary_model = choose_from_list("Model do podsumowań:", models, DEFAULT_SUMMARY_MODEL)
     translate_model = choose_from_list("Model do tłumaczeń (tylko jeśli EN → PL):", models, DEFAULT_TRANSLATE_MODEL)
 
+    # wybrany model spoza listy z cache -> sprawdzamy jeszcze raz na żywym serwerze
+    models = get_models(required=(summary_model, translate_model))
+
     require_model_exists(summary_model, models)
     require_model_exists(translate_model, models)
 
@@ -449,7 +1331,6 @@ def main():
     out_dir.mkdir(parents=True, exist_ok=True)
 
     wav_path = out_dir / "audio.wav"
-    sample_wav = out_dir / "sample.wav"
     transcript_file = out_dir / "transcript.txt"
 
     # ZMIANA: zawsze zapisujemy final w summary_final.txt (język = język spotkania)
@@ -471,59 +1352,51 @@ def main():
         print(f"[2/4] Język wymuszony: {lang}")
     else:
         print("[2/4] Wykrywam język na podstawie próbki (60s)...")
-        extract_audio_sample(wav_path, sample_wav, seconds=60)
-
-        whisper_transcribe(sample_wav, out_dir, lang=None)
-
-        sample_txt = find_biggest_txt(out_dir)
-        sample_text = read_text_utf8(sample_txt)
-        lang = detect_lang_from_text(sample_text)
+        try:
+            lang = detect_language_fast(wav_path, seconds=60)
+        except Exception as e:
+            print(f"[WARN] Wykrywanie języka przez API mlx_whisper nie powiodło się ({e}) – używam CLI.")
+            lang = None
+        if lang is None:
+            lang = detect_language_cli(wav_path, out_dir, seconds=60)
         print(f"[OK] Wykryty język: {lang}")
 
-        # kasujemy sample + txt po próbce, żeby nie mieszać z pełną transkrypcją
-        cleanup_sample_files(out_dir)
-
     # [3/4] pełna transkrypcja (cache)
+    final_summary = None
     if transcript_file.exists():
         use_cache = input("[3/4] Wykryto transcript.txt. Użyć istniejącej transkrypcji? [T/n]: ").strip().lower() != "n"
-        if use_cache:
-            transcript = read_text_utf8(transcript_file)
-        else:
+        if not use_cache:
             try:
                 transcript_file.unlink()
             except Exception:
                 pass
+
+    if not transcript_file.exists():
+        if summary_file.exists():
             print("[3/4] Tworzę transkrypcję (pełne nagranie)...")
-            whisper_transcribe(wav_path, out_dir, lang=lang)
-            transcript_txt = find_biggest_txt(out_dir)
-            transcript = read_text_utf8(transcript_txt)
+            transcript = transcribe_full(wav_path, out_dir, lang)
             write_text_utf8(transcript_file, transcript)
-    else:
-        print("[3/4] Tworzę transkrypcję (pełne nagranie)...")
-        whisper_transcribe(wav_path, out_dir, lang=lang)
-        transcript_txt = find_biggest_txt(out_dir)
-        transcript = read_text_utf8(transcript_txt)
-        write_text_utf8(transcript_file, transcript)
+        else:
+            # brak podsumowania -> podsumowujemy gotowe fragmenty w trakcie transkrypcji
+            print("[3/4] Tworzę transkrypcję (pełne nagranie) i [4/4] na bieżąco podsumowanie...")
+            final_summary = transcribe_and_summarize(summary_model, wav_path, out_dir, transcript_file, summary_file, lang)
 
     # [4/4] podsumowanie (cache)
-    if summary_file.exists():
-        use_sum_cache = input("[4/4] Wykryto summary_final.txt. Użyć istniejącego podsumowania? [T/n]: ").strip().lower() != "n"
-        if use_sum_cache:
-            final_summary = read_text_utf8(summary_file)
+    if final_summary is None:
+        if summary_file.exists():
+            use_sum_cache = input("[4/4] Wykryto summary_final.txt. Użyć istniejącego podsumowania? [T/n]: ").strip().lower() != "n"
+            if use_sum_cache:
+                final_summary = read_text_utf8(summary_file)
+            else:
+                try:
+                    summary_file.unlink()
+                except Exception:
+                    pass
+                print("[4/4] Tworzę podsumowanie...")
+                final_summary = summarize_transcript(summary_model, transcript_file, summary_file, lang)
         else:
-            try:
-                summary_file.unlink()
-            except Exception:
-                pass
             print("[4/4] Tworzę podsumowanie...")
-            partial = summarize_parts(summary_model, transcript, DEFAULT_CHUNK_SIZE, lang)
-            final_summary = summarize_final_two_step(summary_model, partial, lang)
-            write_text_utf8(summary_file, final_summary)
-    else:
-        print("[4/4] Tworzę podsumowanie...")
-        partial = summarize_parts(summary_model, transcript, DEFAULT_CHUNK_SIZE, lang)
-        final_summary = summarize_final_two_step(summary_model, partial, lang)
-        write_text_utf8(summary_file, final_summary)
+            final_summary = summarize_transcript(summary_model, transcript_file, summary_file, lang)
 
     # tłumaczenie do PL tylko jeśli EN
     if lang == "en":